@@ -0,0 +1,289 @@
+"""
+FastAPI application for video creation and Instagram publishing.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import secrets
+import httpx
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, BackgroundTasks, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pyngrok import ngrok
+
+from app.config import settings
+
+# Diretório de logs
+LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+
+def save_request_log(method: str, path: str, body: str, status_code: int = None):
+    """Salva cada request recebido em arquivo na pasta logs."""
+    try:
+        timestamp = datetime.now()
+        date_str = timestamp.strftime("%Y-%m-%d")
+        time_str = timestamp.strftime("%H-%M-%S-%f")[:-3]  # Até milissegundos
+
+        # Nome do arquivo: request_YYYY-MM-DD_HH-MM-SS-mmm.json
+        filename = f"request_{date_str}_{time_str}.json"
+        filepath = os.path.join(LOGS_DIR, filename)
+
+        # Tenta parsear o body como JSON
+        try:
+            body_json = json.loads(body) if body else None
+        except json.JSONDecodeError:
+            body_json = body
+
+        log_data = {
+            "timestamp": timestamp.isoformat(),
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "body": body_json
+        }
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(log_data, f, indent=2, ensure_ascii=False, default=str)
+
+        return filepath
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Erro ao salvar log de request: {e}")
+        return None
+from app.models import (
+    TemplateDynamicParams,
+    VideoCreationRequest,
+    VideoCreationResponse,
+    HealthCheckResponse
+)
+from app.job_queue import job_queue, load_result, Job, JobStatus
+from utils.memory import memory_percent, memory_available_mb
+from utils.renderer import warmup_renderer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Initialize FastAPI app
+app = FastAPI(
+    title=settings.API_TITLE,
+    description=settings.API_DESCRIPTION,
+    version=settings.API_VERSION,
+    docs_url="/docs",
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
+)
+
+# Credenciais só com origens explícitas (wildcard + credentials expõe a API a qualquer site)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=settings.CORS_ORIGINS,
+    allow_credentials="*" not in settings.CORS_ORIGINS,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    """Middleware para capturar TODOS os payloads recebidos (inclusive erros 422)"""
+    # Só rotas de API têm o corpo capturado (evita poluir com /docs, /health, etc),
+    # limitado a REQUEST_LOG_MAX_BYTES
+    is_api = "/api/" in request.url.path
+    body_str = ""
+    if is_api:
+        body = await request.body()
+        body_str = body[:settings.REQUEST_LOG_MAX_BYTES].decode('utf-8', errors='replace') if body else ""
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[PAYLOAD] %s %s - Body: %s", request.method, request.url.path, body_str)
+
+    response = await call_next(request)
+
+    # Salva TODOS os requests de API em arquivo (com status code)
+    if is_api:
+        log_file = save_request_log(
+            method=request.method,
+            path=str(request.url.path),
+            body=body_str,
+            status_code=response.status_code
+        )
+        if log_file:
+            logger.info(f"[LOG SAVED] {log_file}")
+
+    # Log se houve erro de validação (422)
+    if response.status_code == 422:
+        logger.warning(f"[VALIDATION ERROR 422] {request.method} {request.url.path}")
+
+    return response
+
+# Fila externa: com Redis configurado os vídeos são processados pelo worker.py
+# (VideoProcessor/InstagramPublisher só existem lá); sem Redis rodam neste processo
+video_queue = None
+if settings.REDIS_URL:
+    from rq import Queue
+    video_queue = Queue(settings.RQ_QUEUE_NAME, connection=job_queue.redis)
+else:
+    from worker import process_video_job
+
+# Referências das tasks em background (evita que sejam coletadas antes de terminar)
+_background_tasks = set()
+
+
+async def _notify_supabase(public_url: str) -> None:
+    """Envia a URL pública do túnel para o Supabase."""
+    supabase_url = os.getenv("SUPABASE_FUNCTION_URL")
+    supabase_key = os.getenv("SUPABASE_API_KEY")
+
+    if not supabase_url or not supabase_key:
+        logger.warning("SUPABASE_FUNCTION_URL ou SUPABASE_API_KEY não configurados")
+        return
+
+    headers = {
+        "Authorization": f"Bearer {supabase_key}",
+        "apikey": supabase_key,
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "name": "Functions",
+        "url": public_url
+    }
+
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            res = await client.post(supabase_url, json=payload, headers=headers)
+        logger.info(f"URL enviada ao Supabase: {res.status_code}")
+    except Exception as e:
+        logger.error(f"Erro ao enviar URL para Supabase: {e}")
+
+
+@app.on_event("startup")
+async def startup_event():
+    logger.info(f"Starting {settings.API_TITLE} v{settings.API_VERSION}")
+    if not settings.validate():
+        logger.warning("Environment variables missing. Instagram publishing may fail.")
+
+    # Sem Redis os renders rodam neste processo: abre o Chromium antes do primeiro job
+    if not settings.REDIS_URL and settings.RENDER_PROCESSES == 0:
+        warmup_renderer(settings.VIDEO_OUTPUT_DIR)
+
+    # Iniciar túnel ngrok
+    ngrok_auth_token = os.getenv("NGROK_AUTH_TOKEN")
+    if ngrok_auth_token:
+        try:
+            ngrok.set_auth_token(ngrok_auth_token)
+            public_url = ngrok.connect(8000).public_url
+            logger.info(f"Túnel ngrok criado: {public_url}")
+
+            # Envia a URL para o Supabase sem segurar o startup da API
+            task = asyncio.create_task(_notify_supabase(public_url))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        except Exception as e:
+            logger.error(f"Erro ao criar túnel ngrok: {e}")
+    else:
+        logger.info("NGROK_AUTH_TOKEN não configurado - túnel não será criado")
+
+@app.get("/health", response_model=HealthCheckResponse, tags=["Health"])
+async def health_check():
+    return HealthCheckResponse(
+        status="healthy",
+        version=settings.API_VERSION,
+        timestamp=datetime.utcnow().isoformat(),
+        memory_percent=memory_percent(),
+        memory_available_mb=round(memory_available_mb(), 1)
+    )
+
+def _enqueue(template: str, params: dict, background_tasks: BackgroundTasks) -> VideoCreationResponse:
+    """Registra o job e o envia para a fila (Redis) ou para o BackgroundTasks. Roda no threadpool (Redis é bloqueante)."""
+    # Recusa novos jobs quando a máquina já está sem memória
+    if memory_percent() > settings.MEMORY_ACCEPT_THRESHOLD:
+        logger.warning(f"Job recusado: memória acima de {settings.MEMORY_ACCEPT_THRESHOLD}%")
+        raise HTTPException(status_code=503, detail="Server under memory pressure, try again later")
+
+    try:
+        # 16 caracteres URL-safe: chave curta para os dicts/índices da fila
+        job_id = secrets.token_urlsafe(12)
+        job = Job(job_id, template, params)
+        job_queue.add_job(job)
+
+        if video_queue is not None:
+            video_queue.enqueue(
+                "worker.process_video_background",
+                job_id, template, params,
+                job_id=job_id,
+                job_timeout=settings.RQ_JOB_TIMEOUT
+            )
+        else:
+            background_tasks.add_task(process_video_job, job_id, template, params)
+
+        return VideoCreationResponse(status="ok", message="Job accepted", video_id=job_id)
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/videos/create", response_model=VideoCreationResponse, status_code=202, tags=["Videos"])
+async def create_video(request: VideoCreationRequest, background_tasks: BackgroundTasks):
+    """
+    Generic endpoint. Only accepts 'DYNAMIC' or 'E'.
+
+    Flags de controle (no payload):
+    - persist_file: Se True, mantém o arquivo após processamento (padrão: False)
+    - publish_instagram: Se True, publica no Instagram (padrão: True)
+    """
+    if request.template.upper() not in ["DYNAMIC", "E"]:
+        raise HTTPException(status_code=400, detail="Only 'DYNAMIC' template supported.")
+
+    return await run_in_threadpool(_enqueue, request.template, request.params, background_tasks)
+
+@app.post("/api/v1/videos/template-dynamic", response_model=VideoCreationResponse, status_code=202, tags=["Videos"])
+async def create_video_template_dynamic(params: TemplateDynamicParams, background_tasks: BackgroundTasks):
+    """
+    Create video with Template Dynamic (Ultimate).
+
+    Flags de controle:
+    - persist_file: Se True, mantém o arquivo após processamento (padrão: False)
+    - publish_instagram: Se True, publica no Instagram (padrão: True)
+    """
+    # Log imediato do payload validado (útil para debug); só serializa se o INFO estiver ativo
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("[VALIDATED] template-dynamic payload: %s", params.model_dump_json())
+
+    # Dump único em modo JSON: pronto para o BackgroundTasks ou para a fila Redis
+    return await run_in_threadpool(_enqueue, "DYNAMIC", params.model_dump(mode="json"), background_tasks)
+
+def _job_response(job: Job) -> dict:
+    """Job serializado; resultado grande (salvo em disco) volta com o conteúdo, não o caminho no servidor."""
+    data = job.to_dict()
+    if (data["result"] or {}).get("result_file"):
+        data = {**data, "result": load_result(data["result"])}
+    return data
+
+@app.get("/api/v1/videos/{video_id}", tags=["Videos"])
+async def get_video_status(video_id: str):
+    # Fila Redis (e resultado em disco) são chamadas bloqueantes: fora do event loop
+    job = await run_in_threadpool(job_queue.get_job, video_id)
+    if not job: raise HTTPException(status_code=404, detail="Job not found")
+    return await run_in_threadpool(_job_response, job)
+
+@app.get("/api/v1/videos", tags=["Videos"])
+async def list_videos(status_filter: Optional[str] = None, limit: int = 100):
+    status = None
+    if status_filter:
+        try:
+            status = JobStatus.from_label(status_filter)
+        except ValueError:
+            return {"total": 0, "jobs": []}
+    return await run_in_threadpool(_list_jobs, status, limit)
+
+
+def _list_jobs(status: Optional[JobStatus], limit: int) -> dict:
+    jobs = [_job_response(job) for job in job_queue.iter_jobs(status, limit)]
+    return {"total": job_queue.count_jobs(status), "jobs": jobs}
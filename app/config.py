@@ -1,37 +1,94 @@
 import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@dataclass(frozen=True, slots=True)
 class Settings:
-    API_TITLE = "Video Creation API"
-    API_VERSION = "1.0.0"
-    API_DESCRIPTION = "API for automated video creation and Instagram publishing"
+    API_TITLE: str = "Video Creation API"
+    API_VERSION: str = "1.0.0"
+    API_DESCRIPTION: str = "API for automated video creation and Instagram publishing"
     
-    API_HOST = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT = int(os.getenv("API_PORT", "8000"))
-    DEBUG = os.getenv("DEBUG", "True").lower() == "true"
-    
-    VIDEO_OUTPUT_DIR = os.getenv("VIDEO_OUTPUT_DIR", "./output")
+    API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT: int = int(os.getenv("API_PORT", "8000"))
+    DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
+    CORS_ORIGINS: Tuple[str, ...] = tuple(o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip())
+    # Tamanho máximo do corpo capturado pelo log de requests
+    REQUEST_LOG_MAX_BYTES: int = int(os.getenv("REQUEST_LOG_MAX_BYTES", "4096"))
     
+    VIDEO_OUTPUT_DIR: str = os.getenv("VIDEO_OUTPUT_DIR", "./output")
+
+    # Fila externa (Redis/RQ). Sem REDIS_URL os jobs rodam no próprio processo da API
+    REDIS_URL: Optional[str] = os.getenv("REDIS_URL")
+    RQ_QUEUE_NAME: str = os.getenv("RQ_QUEUE_NAME", "videos")
+    RQ_WORKERS: int = int(os.getenv("RQ_WORKERS", str(os.cpu_count() or 1)))
+    RQ_JOB_TIMEOUT: int = int(os.getenv("RQ_JOB_TIMEOUT", "600"))
+
+    # Retenção de jobs finalizados (completed/failed/published)
+    JOB_TTL_SECONDS: int = int(os.getenv("JOB_TTL_SECONDS", str(4 * 60 * 60)))
+    MAX_TERMINAL_JOBS: int = int(os.getenv("MAX_TERMINAL_JOBS", "10000"))
+    # Resultados maiores que isso vão para disco; o job guarda só o caminho
+    JOB_RESULT_MAX_BYTES: int = int(os.getenv("JOB_RESULT_MAX_BYTES", str(16 * 1024)))
+    JOB_RESULTS_DIR: str = os.getenv("JOB_RESULTS_DIR", "./logs/results")
+
+    # Contextos do Chromium mantidos abertos para reaproveitar entre renders
+    RENDER_POOL_SIZE: int = int(os.getenv("RENDER_POOL_SIZE", str(os.cpu_count() or 1)))
+    # Renders por contexto antes de recriá-lo (libera memória acumulada)
+    RENDER_CONTEXT_MAX_RENDERS: int = int(os.getenv("RENDER_CONTEXT_MAX_RENDERS", "20"))
+    # Gravações simultâneas no Playwright e encodes simultâneos no FFmpeg
+    MAX_CONCURRENT_RENDERS: int = int(os.getenv("MAX_CONCURRENT_RENDERS", str(RENDER_POOL_SIZE)))
+    MAX_CONCURRENT_ENCODES: int = int(os.getenv("MAX_CONCURRENT_ENCODES", "1"))
+    # Máximo de vídeos enfileirados codificados por um único processo FFmpeg (1 desativa)
+    ENCODE_BATCH_SIZE: int = int(os.getenv("ENCODE_BATCH_SIZE", "4"))
+    # Processos dedicados a render (0 = renderiza no próprio processo; sugestão: cpu_count // 2)
+    RENDER_PROCESSES: int = int(os.getenv("RENDER_PROCESSES", "0"))
+    # "video": grava WebM no Playwright e converte depois; "screencast": frames do CDP direto no FFmpeg
+    RENDER_CAPTURE_MODE: str = os.getenv("RENDER_CAPTURE_MODE", "video").lower()
+    # Encode em CPU (libx264): preset/CRF pensados para reels vistos no celular
+    X264_PRESET: str = os.getenv("X264_PRESET", "medium")
+    X264_CRF: int = int(os.getenv("X264_CRF", "20"))
+    # Vazio desativa o -tune (conteúdo é majoritariamente texto parado)
+    X264_TUNE: str = os.getenv("X264_TUNE", "stillimage")
+
+    # Limites de memória (% em uso): aceitar job, iniciar render, gravar vídeo final
+    MEMORY_ACCEPT_THRESHOLD: float = float(os.getenv("MEMORY_ACCEPT_THRESHOLD", "75"))
+    MEMORY_RENDER_THRESHOLD: float = float(os.getenv("MEMORY_RENDER_THRESHOLD", "85"))
+    MEMORY_WRITE_THRESHOLD: float = float(os.getenv("MEMORY_WRITE_THRESHOLD", "90"))
+    MEMORY_WAIT_TIMEOUT: float = float(os.getenv("MEMORY_WAIT_TIMEOUT", "300"))
+
     # Credenciais BR
-    INSTAGRAM_ACCESS_TOKEN_BR = os.getenv("INSTAGRAM_ACCESS_TOKEN_BR")
-    INSTAGRAM_ACCOUNT_ID_BR = os.getenv("INSTAGRAM_ACCOUNT_ID_BR")
+    INSTAGRAM_ACCESS_TOKEN_BR: Optional[str] = os.getenv("INSTAGRAM_ACCESS_TOKEN_BR")
+    INSTAGRAM_ACCOUNT_ID_BR: Optional[str] = os.getenv("INSTAGRAM_ACCOUNT_ID_BR")
 
     # Credenciais GLOBAL
-    INSTAGRAM_ACCESS_TOKEN_GLOBAL = os.getenv("INSTAGRAM_ACCESS_TOKEN_GLOBAL")
-    INSTAGRAM_ACCOUNT_ID_GLOBAL = os.getenv("INSTAGRAM_ACCOUNT_ID_GLOBAL")
+    INSTAGRAM_ACCESS_TOKEN_GLOBAL: Optional[str] = os.getenv("INSTAGRAM_ACCESS_TOKEN_GLOBAL")
+    INSTAGRAM_ACCOUNT_ID_GLOBAL: Optional[str] = os.getenv("INSTAGRAM_ACCOUNT_ID_GLOBAL")
+
+    # Tempo máximo esperando o Instagram processar o vídeo antes de publicar
+    INSTAGRAM_PUBLISH_TIMEOUT: float = float(os.getenv("INSTAGRAM_PUBLISH_TIMEOUT", "60"))
+
+    # Pares (token, account_id) por região, ou None se incompletos
+    INSTAGRAM_CREDS_BR: Optional[Tuple[str, str]] = field(init=False)
+    INSTAGRAM_CREDS_GLOBAL: Optional[Tuple[str, str]] = field(init=False)
+
+    def __post_init__(self):
+        br = (self.INSTAGRAM_ACCESS_TOKEN_BR, self.INSTAGRAM_ACCOUNT_ID_BR)
+        global_ = (self.INSTAGRAM_ACCESS_TOKEN_GLOBAL, self.INSTAGRAM_ACCOUNT_ID_GLOBAL)
+        object.__setattr__(self, "INSTAGRAM_CREDS_BR", br if all(br) else None)
+        object.__setattr__(self, "INSTAGRAM_CREDS_GLOBAL", global_ if all(global_) else None)
 
     def ensure_output_dir(self):
         os.makedirs(self.VIDEO_OUTPUT_DIR, exist_ok=True)
 
     def validate(self):
         # Verifica se pelo menos um par de chaves existe para avisar no log
-        br_ok = self.INSTAGRAM_ACCESS_TOKEN_BR and self.INSTAGRAM_ACCOUNT_ID_BR
-        global_ok = self.INSTAGRAM_ACCESS_TOKEN_GLOBAL and self.INSTAGRAM_ACCOUNT_ID_GLOBAL
-        
-        if not br_ok and not global_ok:
-            return False
-        return True
-
-settings = Settings()
\ No newline at end of file
+        return bool(self.INSTAGRAM_CREDS_BR or self.INSTAGRAM_CREDS_GLOBAL)
+
+@lru_cache()
+def get_settings() -> Settings:
+    return Settings()
+
+settings = get_settings()
\ No newline at end of file
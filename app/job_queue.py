@@ -4,20 +4,49 @@ Job queue for managing background video processing tasks.
 
 import json
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
-from enum import Enum
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Any, Iterator, Optional
+from datetime import datetime, timezone
+from enum import IntEnum
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 
-class JobStatus(str, Enum):
-    """Enum for job statuses."""
-    PENDING = "pending"
-    PROCESSING = "processing"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    PUBLISHED = "published"
+class JobStatus(IntEnum):
+    """Enum for job statuses (int internally, rendered as lowercase names)."""
+    PENDING = 0
+    PROCESSING = 1
+    COMPLETED = 2
+    FAILED = 3
+    PUBLISHED = 4
+
+    @property
+    def label(self) -> str:
+        """Public name of the status (e.g. "pending")."""
+        return _STATUS_NAMES[self]
+
+    @classmethod
+    def from_label(cls, label: str) -> "JobStatus":
+        """
+        Parse a public status name.
+
+        Raises:
+            ValueError: If the name is not a known status
+        """
+        try:
+            return _STATUS_BY_NAME[label]
+        except KeyError:
+            raise ValueError(f"Unknown job status: {label}") from None
+
+
+_STATUS_NAMES = {status: status.name.lower() for status in JobStatus}
+_STATUS_BY_NAME = {name: status for status, name in _STATUS_NAMES.items()}
 
 
 class Job:
@@ -36,32 +65,189 @@ class Job:
         self.template = template
         self.params = params
         self.status = JobStatus.PENDING
-        self.created_at = datetime.utcnow()
-        self.started_at: Optional[datetime] = None
-        self.completed_at: Optional[datetime] = None
+        # Timestamps em epoch (time.time()); formatados só na serialização
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
         self.error: Optional[str] = None
         self.result: Optional[Dict[str, Any]] = None
+        # Snapshot serializado de jobs finalizados (não mudam mais)
+        self._cached_dict: Optional[Dict[str, Any]] = None
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert job to dictionary."""
+        return self._cached_dict or self._build_dict()
+
+    def _build_dict(self) -> Dict[str, Any]:
         return {
             "job_id": self.job_id,
             "template": self.template,
-            "status": self.status.value,
-            "created_at": self.created_at.isoformat(),
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "status": _STATUS_NAMES[self.status],
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "completed_at": _isoformat(self.completed_at),
             "error": self.error,
             "result": self.result
         }
 
+    def to_record(self) -> Dict[str, Any]:
+        """Convert job to a storable dictionary (raw timestamps, with params)."""
+        return {
+            "job_id": self.job_id,
+            "template": self.template,
+            "params": self.params,
+            "status": _STATUS_NAMES[self.status],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
+            "error": self.error,
+            "result": self.result,
+            # Jobs finalizados levam o dict público pronto (evita reformatar ao ler do Redis)
+            "snapshot": self._cached_dict
+        }
+
+    @classmethod
+    def from_record(cls, data: Dict[str, Any]) -> "Job":
+        """
+        Rebuild a job from its stored form.
+
+        Args:
+            data: Dictionary produced by to_record
+
+        Returns:
+            Job object
+        """
+        job = cls(data["job_id"], data["template"], data.get("params") or {})
+        job.status = JobStatus.from_label(data["status"])
+        job.created_at = data["created_at"]
+        job.started_at = data.get("started_at")
+        job.completed_at = data.get("completed_at")
+        job.error = data.get("error")
+        job.result = data.get("result")
+        if job.status in TERMINAL_STATUSES:
+            job._cached_dict = data.get("snapshot")
+        return job
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    """Format an epoch timestamp as an ISO 8601 UTC string."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat() if timestamp else None
+
+
+TERMINAL_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.PUBLISHED)
+
+
+def _result_path(job_id: str) -> str:
+    """Path of the spilled result file of a job."""
+    return os.path.join(settings.JOB_RESULTS_DIR, f"{job_id}.json")
+
+
+def _compact_result(job_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Spill large results to disk so the job only keeps a reference.
+
+    Args:
+        job_id: Job identifier
+        result: Result data
+
+    Returns:
+        The result itself, or {"result_file": path} when it is too large
+    """
+    payload = json.dumps(result, ensure_ascii=False, default=str)
+    if len(payload) <= settings.JOB_RESULT_MAX_BYTES:
+        return result
+
+    try:
+        os.makedirs(settings.JOB_RESULTS_DIR, exist_ok=True)
+        filepath = _result_path(job_id)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        return {"result_file": filepath}
+    except Exception as e:
+        logger.error(f"Erro ao salvar resultado do job {job_id}: {e}")
+        return result
+
+
+def load_result(result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a result that was spilled to disk by _compact_result.
+
+    Args:
+        result: Stored result (possibly {"result_file": path})
+
+    Returns:
+        The full result, or None if the spilled file is gone
+    """
+    result_file = (result or {}).get("result_file")
+    if not result_file:
+        return result
+    try:
+        with open(result_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Resultado em disco indisponível ({result_file}): {e}")
+        return None
+
+
+def _remove_result_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Erro ao remover resultado {path}: {e}")
+
+
+def _apply_status(job: Job, status: JobStatus,
+                  error: Optional[str] = None,
+                  result: Optional[Dict[str, Any]] = None) -> None:
+    """Apply a status transition (and its timestamps) to a job."""
+    job.status = status
+
+    if status == JobStatus.PROCESSING and not job.started_at:
+        job.started_at = time.time()
+
+    if status in TERMINAL_STATUSES:
+        job.completed_at = time.time()
+
+    if error:
+        job.error = error
+
+    if result:
+        job.result = _compact_result(job.job_id, result)
+
+    job._cached_dict = job._build_dict() if status in TERMINAL_STATUSES else None
+
 
 class JobQueue:
-    """In-memory job queue for managing background tasks."""
+    """
+    In-memory job queue for managing background tasks.
+
+    Jobs are kept in insertion order and indexed by status, so per-status
+    lookups only touch the jobs in that status. All access goes through a
+    lock because the API thread and the BackgroundTasks executor share it.
+
+    Finished jobs are retained for at most ttl_seconds and at most
+    max_terminal_jobs of them are kept; the oldest finished jobs are evicted
+    first. Pending and processing jobs are never evicted.
+    """
     
-    def __init__(self):
-        """Initialize the job queue."""
-        self.jobs: Dict[str, Job] = {}
+    def __init__(self, ttl_seconds: Optional[int] = None, max_terminal_jobs: Optional[int] = None):
+        """
+        Initialize the job queue.
+
+        Args:
+            ttl_seconds: How long finished jobs are kept (default from settings)
+            max_terminal_jobs: How many finished jobs are kept (default from settings)
+        """
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Índice por status (dict usado como set ordenado)
+        self._by_status: Dict[JobStatus, Dict[str, None]] = {s: {} for s in JobStatus}
+        # Jobs finalizados, do mais antigo para o mais recente
+        self._terminal: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.JOB_TTL_SECONDS
+        self.max_terminal_jobs = max_terminal_jobs if max_terminal_jobs is not None else settings.MAX_TERMINAL_JOBS
     
     def add_job(self, job: Job) -> None:
         """
@@ -70,7 +256,9 @@ class JobQueue:
         Args:
             job: Job object to add
         """
-        self.jobs[job.job_id] = job
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._by_status[job.status][job.job_id] = None
         logger.info(f"Job {job.job_id} added to queue")
     
     def get_job(self, job_id: str) -> Optional[Job]:
@@ -83,7 +271,9 @@ class JobQueue:
         Returns:
             Job object or None if not found
         """
-        return self.jobs.get(job_id)
+        with self._lock:
+            self._evict_if_over()
+            return self.jobs.get(job_id)
     
     def update_job_status(self, job_id: str, status: JobStatus, 
                          error: Optional[str] = None, 
@@ -100,27 +290,39 @@ class JobQueue:
         Returns:
             True if successful, False if job not found
         """
-        job = self.jobs.get(job_id)
-        if not job:
-            return False
-        
-        job.status = status
-        
-        if status == JobStatus.PROCESSING and not job.started_at:
-            job.started_at = datetime.utcnow()
-        
-        if status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.PUBLISHED]:
-            job.completed_at = datetime.utcnow()
-        
-        if error:
-            job.error = error
-        
-        if result:
-            job.result = result
-        
-        logger.info(f"Job {job_id} status updated to {status.value}")
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job:
+                return False
+
+            self._by_status[job.status].pop(job_id, None)
+            _apply_status(job, status, error, result)
+            self._by_status[status][job_id] = None
+
+            if status in TERMINAL_STATUSES:
+                self._terminal[job_id] = job.completed_at
+                self._terminal.move_to_end(job_id)
+                self._evict_if_over()
+
+        logger.info(f"Job {job_id} status updated to {status.label}")
         return True
     
+    def _evict_if_over(self) -> None:
+        """Drop expired finished jobs and keep at most max_terminal_jobs. Caller holds the lock."""
+        cutoff = time.time() - self.ttl
+        while self._terminal:
+            job_id, completed_at = next(iter(self._terminal.items()))
+            if len(self._terminal) <= self.max_terminal_jobs and completed_at >= cutoff:
+                break
+            self._terminal.popitem(last=False)
+            job = self.jobs.pop(job_id, None)
+            if job:
+                self._by_status[job.status].pop(job_id, None)
+                result_file = (job.result or {}).get("result_file")
+                if result_file:
+                    _remove_result_file(result_file)
+                logger.info(f"Job {job_id} evicted from queue")
+
     def get_all_jobs(self) -> Dict[str, Dict[str, Any]]:
         """
         Get all jobs as dictionaries.
@@ -128,8 +330,49 @@ class JobQueue:
         Returns:
             Dictionary of all jobs
         """
-        return {job_id: job.to_dict() for job_id, job in self.jobs.items()}
+        with self._lock:
+            self._evict_if_over()
+            jobs = list(self.jobs.values())
+        return {job.job_id: job.to_dict() for job in jobs}
     
+    def iter_jobs(self, status: Optional[JobStatus] = None, limit: int = 100) -> Iterator[Job]:
+        """
+        Iterate over at most `limit` jobs, optionally filtered by status.
+
+        Args:
+            status: Only jobs in this status (None for all jobs)
+            limit: Maximum number of jobs returned
+
+        Returns:
+            Iterator of Job objects
+        """
+        limit = max(limit, 0)
+        with self._lock:
+            self._evict_if_over()
+            if status is None:
+                jobs = list(islice(self.jobs.values(), limit))
+            else:
+                jobs = [self.jobs[job_id] for job_id in islice(self._by_status[status], limit)]
+        return iter(jobs)
+
+    def count_jobs(self, status: Optional[JobStatus] = None) -> int:
+        """
+        Count jobs, optionally filtered by status.
+
+        Args:
+            status: Only jobs in this status (None for all jobs)
+
+        Returns:
+            Number of jobs
+        """
+        with self._lock:
+            self._evict_if_over()
+            return len(self.jobs) if status is None else len(self._by_status[status])
+
+    def _jobs_with_status(self, status: JobStatus) -> list:
+        with self._lock:
+            return [self.jobs[job_id] for job_id in self._by_status[status]]
+
     def get_pending_jobs(self) -> list:
         """
         Get all pending jobs.
@@ -137,7 +380,7 @@ class JobQueue:
         Returns:
             List of pending jobs
         """
-        return [job for job in self.jobs.values() if job.status == JobStatus.PENDING]
+        return self._jobs_with_status(JobStatus.PENDING)
     
     def get_processing_jobs(self) -> list:
         """
@@ -146,8 +389,125 @@ class JobQueue:
         Returns:
             List of processing jobs
         """
-        return [job for job in self.jobs.values() if job.status == JobStatus.PROCESSING]
+        return self._jobs_with_status(JobStatus.PROCESSING)
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Redis-backed job queue shared between the API and the RQ workers.
+
+    Each job is stored as a JSON string under ``video_job:<job_id>`` and
+    indexed by creation time in the ``video_jobs`` sorted set, plus one
+    ``video_jobs:<status>`` sorted set per status (finished statuses are
+    scored by completion time instead). Finished jobs expire after
+    settings.JOB_TTL_SECONDS; on every finished transition the finished
+    entries older than that are trimmed from the indexes and their spilled
+    result files are removed. Pending and processing jobs are never trimmed.
+    """
+
+    KEY_PREFIX = "video_job:"
+    INDEX_KEY = "video_jobs"
+
+    def __init__(self, redis_client):
+        """
+        Initialize the job queue.
+
+        Args:
+            redis_client: Connected redis.Redis instance
+        """
+        self.redis = redis_client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisJobQueue":
+        """Create a queue connected to the given Redis URL."""
+        from redis import Redis
+
+        return cls(Redis.from_url(url))
+
+    def _status_key(self, status: JobStatus) -> str:
+        return f"{self.INDEX_KEY}:{status.label}"
+
+    def _save(self, pipe, job: Job) -> None:
+        pipe.set(self.KEY_PREFIX + job.job_id, json.dumps(job.to_record(), default=str))
+
+    def _load(self, job_ids) -> list:
+        if not job_ids:
+            return []
+        keys = [self.KEY_PREFIX + (i.decode() if isinstance(i, bytes) else i) for i in job_ids]
+        return [Job.from_record(json.loads(raw)) for raw in self.redis.mget(keys) if raw]
+
+    def add_job(self, job: Job) -> None:
+        score = job.created_at
+        pipe = self.redis.pipeline()
+        self._save(pipe, job)
+        pipe.zadd(self.INDEX_KEY, {job.job_id: score})
+        pipe.zadd(self._status_key(job.status), {job.job_id: score})
+        pipe.execute()
+        logger.info(f"Job {job.job_id} added to queue")
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        raw = self.redis.get(self.KEY_PREFIX + job_id)
+        return Job.from_record(json.loads(raw)) if raw else None
+
+    def update_job_status(self, job_id: str, status: JobStatus,
+                         error: Optional[str] = None,
+                         result: Optional[Dict[str, Any]] = None) -> bool:
+        job = self.get_job(job_id)
+        if not job:
+            return False
+
+        previous = job.status
+        _apply_status(job, status, error, result)
+
+        # Troca de índice e gravação do job numa única transação
+        finished = status in TERMINAL_STATUSES
+        pipe = self.redis.pipeline()
+        self._save(pipe, job)
+        pipe.zrem(self._status_key(previous), job_id)
+        pipe.zadd(self._status_key(status), {job_id: job.completed_at if finished else job.created_at})
+        if finished:
+            pipe.expire(self.KEY_PREFIX + job_id, settings.JOB_TTL_SECONDS)
+            self._trim_expired(pipe, time.time() - settings.JOB_TTL_SECONDS)
+        pipe.execute()
+
+        logger.info(f"Job {job_id} status updated to {status.label}")
+        return True
+
+    def _trim_expired(self, pipe, cutoff: float) -> None:
+        """Drop finished jobs completed before cutoff from the indexes and remove their result files."""
+        for status in TERMINAL_STATUSES:
+            key = self._status_key(status)
+            expired = self.redis.zrangebyscore(key, 0, cutoff)
+            if not expired:
+                continue
+            pipe.zremrangebyscore(key, 0, cutoff)
+            pipe.zrem(self.INDEX_KEY, *expired)
+            for expired_id in expired:
+                _remove_result_file(_result_path(expired_id.decode() if isinstance(expired_id, bytes) else expired_id))
+
+    def get_all_jobs(self) -> Dict[str, Dict[str, Any]]:
+        jobs = self._load(self.redis.zrange(self.INDEX_KEY, 0, -1))
+        return {job.job_id: job.to_dict() for job in jobs}
+
+    def iter_jobs(self, status: Optional[JobStatus] = None, limit: int = 100) -> Iterator[Job]:
+        if limit <= 0:
+            return iter([])
+        key = self.INDEX_KEY if status is None else self._status_key(status)
+        return iter(self._load(self.redis.zrange(key, 0, limit - 1)))
+
+    def count_jobs(self, status: Optional[JobStatus] = None) -> int:
+        return self.redis.zcard(self.INDEX_KEY if status is None else self._status_key(status))
+
+    def _jobs_with_status(self, status: JobStatus) -> list:
+        return self._load(self.redis.zrange(self._status_key(status), 0, -1))
+
+
+def create_job_queue() -> JobQueue:
+    """Build the job queue backend selected by the settings."""
+    if settings.REDIS_URL:
+        return RedisJobQueue.from_url(settings.REDIS_URL)
+    return JobQueue()
 
 
 # Global job queue instance
-job_queue = JobQueue()
+job_queue = create_job_queue()
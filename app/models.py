@@ -1,13 +1,17 @@
 from typing import Optional, List, Dict, Any, Literal
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 class Victim(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     name: str
     photo_url: str
     cause: str = "EMPURRADO"
     old_position: int = 9
 
 class TemplateDynamicParams(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     region: Literal["BR", "GLOBAL"] = "BR"
     event_type: str = "GOLPE NO TRONO"
     hook: str = "O REI CAIU!"
@@ -17,8 +21,8 @@ class TemplateDynamicParams(BaseModel):
     message: Optional[str] = None
     dethroned_name: Optional[str] = None
     dethroned_photo_url: Optional[str] = None
-    dethroned_reign_days: Optional[int] = 0
-    victims: Optional[List[Victim]] = []
+    dethroned_reign_days: int = 0
+    victims: List[Victim] = Field(default_factory=list)
     cta: str = "QUEM VAI DESAFIAR?"
 
     # Flags de controle
@@ -26,15 +30,19 @@ class TemplateDynamicParams(BaseModel):
     publish_instagram: bool = True  # Se True, publica no Instagram
 
 class VideoCreationRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     template: str
     params: Dict[str, Any]
 
 class VideoCreationResponse(BaseModel):
     status: str
     message: Optional[str] = None
-    video_id: str
+    video_id: str = Field(description="Job identifier (16-character URL-safe token)")
 
 class HealthCheckResponse(BaseModel):
     status: str
     version: str
-    timestamp: str
\ No newline at end of file
+    timestamp: str
+    memory_percent: Optional[float] = None
+    memory_available_mb: Optional[float] = None
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Memory pressure checks used to throttle video jobs.
+
+Thresholds are percentages of used system memory (psutil.virtual_memory().percent).
+"""
+
+import asyncio
+import logging
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+def memory_percent() -> float:
+    """Percentual de memória do sistema em uso."""
+    return psutil.virtual_memory().percent
+
+
+def memory_available_mb() -> float:
+    """Memória disponível em MB."""
+    return psutil.virtual_memory().available / (1024 * 1024)
+
+
+async def wait_for_memory_async(threshold: float, timeout: float, interval: float = 1.0) -> bool:
+    """
+    Aguarda (sem bloquear o event loop) o uso de memória ficar abaixo de threshold.
+
+    Returns:
+        True se a memória liberou, False se o timeout estourou
+    """
+    deadline = time.monotonic() + timeout
+    while memory_percent() > threshold:
+        if time.monotonic() >= deadline:
+            return False
+        logger.warning(f"Memória acima de {threshold}% - aguardando...")
+        await asyncio.sleep(interval)
+    return True
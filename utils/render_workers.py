@@ -0,0 +1,164 @@
+"""
+Renders em processos separados (RENDER_PROCESSES > 0).
+
+Cada RenderWorker tem o próprio GIL, event loop, Playwright e Chromium, e
+consome jobs de uma multiprocessing.Queue compartilhada. Com RENDER_PROCESSES=0
+(padrão) o render roda no loop de render do próprio processo.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# spawn: o processo pai já tem threads (loop de render, uvicorn), fork não é seguro
+_mp = multiprocessing.get_context("spawn")
+
+
+class RenderWorker(_mp.Process):
+    """Processo que roda render_video para os jobs recebidos em `jobs`."""
+
+    def __init__(self, jobs, results):
+        super().__init__(daemon=True)
+        self.jobs = jobs
+        self.results = results
+
+    def run(self) -> None:
+        from .renderer import _new_render_loop
+
+        loop = _new_render_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._serve())
+
+    async def _serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Limita quantos jobs este processo pega, deixando o resto para os outros workers
+        slots = asyncio.Semaphore(settings.MAX_CONCURRENT_RENDERS)
+        tasks = set()
+        while True:
+            await slots.acquire()
+            job = await loop.run_in_executor(None, self.jobs.get)
+            if job is None:
+                break
+            task = asyncio.create_task(self._render(*job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _render(self, job_id: str, kwargs: dict) -> None:
+        from .renderer import render_video
+
+        self.results.put((job_id, "started", os.getpid()))
+        try:
+            output_path = await render_video(**kwargs)
+            self.results.put((job_id, "done", output_path))
+        except Exception as e:
+            self.results.put((job_id, "error", f"{type(e).__name__}: {e}"))
+
+
+def _resolve(future: Optional[Future], result=None, error: Optional[BaseException] = None) -> None:
+    """Entrega o resultado; ignora futures já canceladas (ex.: job que estourou o timeout)."""
+    if future is None or future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # Cancelada entre o done() e o set_*: a thread de resultados não pode morrer por isso
+        pass
+
+
+class RenderProcessPool:
+    """Distribui renders entre `processes` RenderWorkers e devolve Futures no processo pai."""
+
+    def __init__(self, processes: int):
+        self._jobs = _mp.Queue()
+        self._results = _mp.Queue()
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        # job_id -> pid do worker que está renderizando (para falhar o job se o processo morrer)
+        self._running: Dict[str, int] = {}
+        self._workers = [self._start_worker() for _ in range(max(1, processes))]
+        threading.Thread(target=self._collect, name="render-results", daemon=True).start()
+        logger.info(f"🧵 {len(self._workers)} processo(s) de render iniciados")
+
+    def _start_worker(self) -> RenderWorker:
+        worker = RenderWorker(self._jobs, self._results)
+        worker.start()
+        return worker
+
+    def submit(self, **kwargs) -> Future:
+        """Enfileira um render_video(**kwargs); a Future resolve com o caminho do vídeo final."""
+        job_id = uuid.uuid4().hex
+        future = Future()
+        with self._lock:
+            self._futures[job_id] = future
+        self._jobs.put((job_id, kwargs))
+        return future
+
+    def _collect(self) -> None:
+        # Esta thread resolve todas as futures: um erro aqui não pode encerrar o loop
+        while True:
+            try:
+                self._collect_one()
+            except Exception as e:
+                logger.error(f"Erro ao processar resultado de render: {e}", exc_info=True)
+
+    def _collect_one(self) -> None:
+        try:
+            job_id, kind, value = self._results.get(timeout=1)
+        except queue.Empty:
+            self._check_workers()
+            return
+
+        with self._lock:
+            if kind == "started":
+                self._running[job_id] = value
+                return
+            self._running.pop(job_id, None)
+            future = self._futures.pop(job_id, None)
+        if kind == "done":
+            _resolve(future, result=value)
+        else:
+            _resolve(future, error=RuntimeError(value))
+
+    def _check_workers(self) -> None:
+        """Repõe workers que morreram (ex.: OOM) e falha os jobs que estavam com eles."""
+        for i, worker in enumerate(self._workers):
+            if worker.is_alive():
+                continue
+            logger.error(f"Processo de render {worker.pid} morreu (exitcode={worker.exitcode}) - reiniciando")
+            with self._lock:
+                lost = [job_id for job_id, pid in self._running.items() if pid == worker.pid]
+                futures = [self._futures.pop(job_id, None) for job_id in lost]
+                for job_id in lost:
+                    del self._running[job_id]
+            for future in futures:
+                _resolve(future, error=RuntimeError(f"Processo de render {worker.pid} morreu"))
+            self._workers[i] = self._start_worker()
+
+
+_pool: Optional[RenderProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_process_pool() -> RenderProcessPool:
+    """Pool de processos de render, iniciado no primeiro uso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderProcessPool(settings.RENDER_PROCESSES)
+    return _pool
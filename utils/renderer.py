@@ -1,154 +1,678 @@
 import os
 import asyncio
+import base64
 import subprocess
 import glob
+import sys
+import shutil
+import functools
+import threading
+from typing import Optional
 from playwright.async_api import async_playwright
+try:
+    import uvloop
+except ImportError:  # Windows ou ambiente sem uvloop: usa o loop padrão do asyncio
+    uvloop = None
 import logging
+from app.config import settings
+from .memory import wait_for_memory_async
 
 logger = logging.getLogger(__name__)
 
-def get_ffmpeg_path():
-    """Tenta localizar o FFmpeg baixado pelo Playwright ou do sistema."""
-    # 1. Tenta no PATH do sistema
+
+class RendererPool:
+    """
+    Um Chromium headless compartilhado + pool de BrowserContexts reaproveitados.
+
+    Cada combinação (diretório de gravação, largura, altura) tem até `size`
+    contextos em uso ao mesmo tempo; os livres ficam guardados para o próximo
+    render. Um contexto é recriado depois de `max_renders` vídeos para
+    devolver a memória acumulada pelo Chromium.
+    """
+
+    def __init__(self, size: int, max_renders: int):
+        self.size = max(1, size)
+        self.max_renders = max(1, max_renders)
+        self._playwright = None
+        self._browser = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._slots: dict = {}
+        self._idle: dict = {}
+        # contexto -> (renders feitos, geração do browser que o criou)
+        self._uses: dict = {}
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._browser is None or not self._browser.is_connected():
+                if self._browser is not None:
+                    logger.warning("Chromium do pool desconectado - abrindo outro")
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._generation += 1
+            return self._browser
+
+    async def _new_context(self, output_dir: Optional[str], width: int, height: int):
+        browser = await self._get_browser()
+        options = {"viewport": {"width": width, "height": height}}
+        if output_dir:
+            options["record_video_dir"] = output_dir
+            options["record_video_size"] = {"width": width, "height": height}
+        # 'color_scheme': 'dark' ajuda a evitar o flash branco inicial
+        context = await browser.new_context(**options, color_scheme='dark')
+        self._uses[context] = (0, self._generation)
+        return context
+
+    async def acquire(self, output_dir: Optional[str], width: int, height: int):
+        """Retorna um contexto livre (gravando em output_dir, ou sem gravação se None), criando um se preciso."""
+        key = (output_dir, width, height)
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.size))
+        idle = self._idle.setdefault(key, [])
+
+        await slots.acquire()
+        try:
+            while idle:
+                context = idle.pop()
+                if self._uses[context][1] == self._generation and self._browser.is_connected():
+                    return context
+                await self._discard(context)
+            return await self._new_context(output_dir, width, height)
+        except Exception:
+            slots.release()
+            raise
+
+    async def release(self, context, output_dir: Optional[str], width: int, height: int) -> None:
+        """Devolve o contexto ao pool (ou o recicla se já gravou max_renders vídeos)."""
+        key = (output_dir, width, height)
+        uses, generation = self._uses[context]
+        uses += 1
+        try:
+            if uses >= self.max_renders or generation != self._generation:
+                await self._discard(context)
+            else:
+                self._uses[context] = (uses, generation)
+                self._idle[key].append(context)
+        finally:
+            self._slots[key].release()
+
+    async def warmup(self, output_dir: Optional[str], width: int, height: int, contexts: int = 1) -> None:
+        """Abre o Chromium e deixa `contexts` contextos prontos antes do primeiro job."""
+        acquired = [await self.acquire(output_dir, width, height) for _ in range(min(contexts, self.size))]
+        for context in acquired:
+            await self.release(context, output_dir, width, height)
+
+    async def _discard(self, context) -> None:
+        self._uses.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar contexto do pool: {e}")
+
+
+renderer_pool = RendererPool(settings.RENDER_POOL_SIZE, settings.RENDER_CONTEXT_MAX_RENDERS)
+
+# Event loop dedicado aos renders: o pool (e o Playwright) ficam presos ao
+# loop em que foram criados, então ele precisa viver entre um job e outro
+_render_loop = None
+_render_loop_lock = threading.Lock()
+
+
+def _new_render_loop() -> asyncio.AbstractEventLoop:
+    """uvloop quando disponível (Linux/macOS); no Windows o loop padrão (Proactor) suporta subprocessos."""
+    if uvloop is not None and sys.platform != "win32":
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def _get_render_loop() -> asyncio.AbstractEventLoop:
+    global _render_loop
+    with _render_loop_lock:
+        if _render_loop is None:
+            _render_loop = _new_render_loop()
+            threading.Thread(target=_render_loop.run_forever, name="render-loop", daemon=True).start()
+    return _render_loop
+
+
+def run_in_render_loop(coro):
+    """Executa a coroutine no loop de render (thread própria) e bloqueia até o resultado."""
+    future = asyncio.run_coroutine_threadsafe(coro, _get_render_loop())
     try:
-        subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return "ffmpeg"
-    except FileNotFoundError:
-        pass
+        return future.result()
+    except BaseException:
+        # Ex.: JobTimeoutException do RQ (SIGALRM) na thread que espera: cancela a
+        # coroutine para ela não continuar rodando depois do job ser dado como falho
+        future.cancel()
+        raise
+
 
-    # 2. Procura na pasta do Playwright (Windows)
+def warmup_renderer(output_dir: str, width: int = 1080, height: int = 1920) -> None:
+    """
+    Agenda (sem bloquear) a abertura do Chromium e dos contextos no loop de render,
+    para o primeiro job não pagar o launch do browser.
+    """
+    output_dir = os.path.abspath(output_dir)
+    future = asyncio.run_coroutine_threadsafe(
+        renderer_pool.warmup(output_dir, width, height, settings.MAX_CONCURRENT_RENDERS),
+        _get_render_loop()
+    )
+
+    def _log_result(f):
+        if f.exception():
+            logger.warning(f"Warmup do Chromium falhou (será aberto no primeiro render): {f.exception()}")
+        else:
+            logger.info("🌐 Chromium e contextos de render prontos")
+
+    future.add_done_callback(_log_result)
+
+
+async def await_in_render_loop(coro):
+    """Aguarda a coroutine no loop de render a partir de qualquer event loop (ex.: o do FastAPI)."""
+    loop = _get_render_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+def _playwright_ffmpeg() -> Optional[str]:
+    """FFmpeg baixado pelo Playwright (Windows)."""
     user_home = os.path.expanduser("~")
     pw_paths = glob.glob(os.path.join(user_home, "AppData", "Local", "ms-playwright", "ffmpeg-*", "ffmpeg.exe"))
-    
-    if pw_paths:
-        return pw_paths[0]
-        
-    return None
+    return pw_paths[0] if pw_paths else None
 
-async def render_video(
-    html_content: str, 
-    output_path: str, 
-    audio_path: str = None,
-    width: int = 1080, 
-    height: int = 1920, 
-    duration: int = 15000
-) -> str:
-    
-    output_dir = os.path.dirname(os.path.abspath(output_path))
-    temp_html_path = os.path.join(output_dir, f"temp_{os.path.basename(output_path)}.html")
-    raw_video_path = os.path.join(output_dir, f"raw_{os.path.basename(output_path)}") # Vídeo sem áudio
-    
-    # Salva HTML
-    with open(temp_html_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
-    
-    abs_html_url = f"file:///{os.path.abspath(temp_html_path).replace(os.sep, '/')}"
-    
-    logger.info(f"🎥 Renderizando visual...")
-    logger.info(f"🎵 Áudio selecionado: {audio_path}")
-    logger.info(f"🎵 Áudio existe: {os.path.exists(audio_path) if audio_path else 'N/A'}")
 
-    async with async_playwright() as p:
-        # 'color_scheme': 'dark' ajuda a evitar o flash branco inicial
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            viewport={"width": width, "height": height},
-            record_video_dir=output_dir,
-            record_video_size={"width": width, "height": height},
-            color_scheme='dark' 
-        )
-        
-        page = await context.new_page()
+@functools.lru_cache(maxsize=1)
+def get_ffmpeg_path():
+    """Localiza o FFmpeg no PATH do sistema ou o baixado pelo Playwright (resolvido uma vez)."""
+    return shutil.which("ffmpeg") or _playwright_ffmpeg()
 
-        # Garante fundo preto antes de carregar
-        await page.add_style_tag(content="html, body { background-color: #000 !important; }")
 
-        await page.goto(abs_html_url, wait_until="networkidle")
+@functools.lru_cache(maxsize=None)
+def _ffmpeg_encoders(ffmpeg_exe: str) -> frozenset:
+    """Nomes dos encoders do FFmpeg (`ffmpeg -encoders` roda uma única vez por binário)."""
+    try:
+        output = subprocess.run([ffmpeg_exe, "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    except OSError:
+        return frozenset()
+    # Linhas no formato " V....D libx264   descrição"
+    return frozenset(
+        parts[1] for parts in map(str.split, output.splitlines())
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[1] != "="
+    )
 
-        # Aguarda imagem principal carregar completamente
-        await page.wait_for_function("""
-            () => {
-                const img = document.querySelector('.avatar-main');
-                return img && img.complete && img.naturalWidth > 0;
-            }
-        """, timeout=10000)
 
-        # Aguarda conteúdo estar visível (instant-visible ou active)
-        await page.wait_for_selector('.frame.instant-visible, .frame.active', state='visible', timeout=5000)
+def _has_encoder(ffmpeg_exe: str, name: str) -> bool:
+    """True se o FFmpeg tem o encoder `name` (ex.: "h264_nvenc", "h264_vaapi")."""
+    return name in _ffmpeg_encoders(ffmpeg_exe)
 
-        # Aguarda fontes carregarem
-        await page.wait_for_function("document.fonts.ready.then(() => true)", timeout=5000)
 
-        # Aguarda um pouco mais para garantir que o primeiro frame está completamente renderizado
-        await page.wait_for_timeout(300)
+# Resultado dos probes de GPU (None = ainda não verificado)
+_HAS_NVENC = None
+_HAS_CUDA_PIPELINE = None
+# NVENC já codificou um vídeo com sucesso neste processo (builds de distro listam
+# h264_nvenc mesmo sem GPU, então a lista de encoders sozinha não basta)
+_NVENC_CONFIRMED = False
 
-        # Grava a duração completa
-        await page.wait_for_timeout(duration)
-        await context.close()
-        await browser.close()
-        
-        # Renomeia o vídeo cru
-        video_obj = page.video
-        if video_obj:
-            saved_path = await video_obj.path()
-            if os.path.exists(raw_video_path): os.remove(raw_video_path)
-            os.rename(saved_path, raw_video_path)
-    
-    # --- FASE 2: PÓS-PROCESSAMENTO (FFMPEG) ---
-    ffmpeg_exe = get_ffmpeg_path()
-    
-    if not ffmpeg_exe:
-        logger.error("FFmpeg não encontrado! O vídeo ficará sem áudio e pode não funcionar no WhatsApp.")
-        if os.path.exists(output_path): os.remove(output_path)
-        os.rename(raw_video_path, output_path)
-        return output_path
 
-    logger.info("🎵 Adicionando áudio e convertendo para WhatsApp...")
-    
-    # Comando FFmpeg para adicionar áudio e converter para H.264 compatível
+def _check_nvenc_available(ffmpeg_exe: str) -> bool:
+    """Verifica uma única vez se o FFmpeg tem o encoder h264_nvenc."""
+    global _HAS_NVENC
+    if _HAS_NVENC is None:
+        _HAS_NVENC = _has_encoder(ffmpeg_exe, "h264_nvenc")
+        logger.info(f"🎛️ NVENC disponível: {_HAS_NVENC}")
+    return _HAS_NVENC
+
+
+def _check_cuda_pipeline_available(ffmpeg_exe: str) -> bool:
+    """
+    Verifica uma única vez se dá para manter o vídeo na GPU do decode ao encode:
+    NVENC + hwaccel cuda + filtro scale_npp.
+    """
+    global _HAS_CUDA_PIPELINE
+    if _HAS_CUDA_PIPELINE is None:
+        _HAS_CUDA_PIPELINE = False
+        if _check_nvenc_available(ffmpeg_exe):
+            try:
+                hwaccels = subprocess.run([ffmpeg_exe, "-hide_banner", "-hwaccels"], capture_output=True).stdout
+                filters = subprocess.run([ffmpeg_exe, "-hide_banner", "-filters"], capture_output=True).stdout
+                _HAS_CUDA_PIPELINE = b"cuda" in hwaccels.split() and b"scale_npp" in filters
+            except OSError:
+                pass
+        logger.info(f"🎛️ Pipeline CUDA disponível: {_HAS_CUDA_PIPELINE}")
+    return _HAS_CUDA_PIPELINE
+
 
-    cmd = [
-        ffmpeg_exe, "-y",
+def _raw_video_input(raw_video_path: str) -> list:
+    """Argumentos de entrada para o vídeo cru gravado pelo Playwright."""
+    return [
         "-ss", "0.3",           # Corte do início para remover possíveis frames brancos/pretos
-        "-r", "60",             # Força 60 FPS de entrada
-        "-i", raw_video_path,
+        "-i", raw_video_path,   # Timestamps originais (~25 FPS do Playwright); o fps=60 da saída converte
     ]
 
-    if audio_path and os.path.exists(audio_path):
+
+def _build_ffmpeg_cmd(ffmpeg_exe: str, input_args: list, audio_path: str, output_path: str, encoder: str) -> list:
+    """
+    Monta o comando FFmpeg que adiciona o áudio e converte para H.264.
+
+    encoder: "cuda" (decode, escala e encode na GPU), "h264_nvenc" ou "libx264"
+    """
+    cmd = [ffmpeg_exe, "-y"]
+
+    if encoder == "cuda":
+        # Frames decodificados ficam na VRAM até o NVENC (sem cópias CPU<->GPU)
+        cmd.extend(["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"])
+
+    cmd.extend(input_args)
+
+    if audio_path:
         cmd.extend(["-i", audio_path])
         cmd.extend(["-map", "0:v:0", "-map", "1:a:0", "-shortest"])
 
+    cmd.extend(_output_args(encoder))
+    cmd.append(output_path)
+    return cmd
+
+
+def _output_args(encoder: str) -> list:
+    """Opções de saída (vídeo H.264 60 FPS + AAC) para o encoder escolhido."""
+    cmd = []
+    if encoder in ("cuda", "h264_nvenc"):
+        # Encode na GPU (NVENC), qualidade constante equivalente
+        cmd.extend([
+            "-c:v", "h264_nvenc",
+            "-preset", "p5",
+            "-tune", "ll",          # Texto quase estático: sem lookahead nem AQ espacial
+            "-rc", "vbr",
+            "-cq", "20",
+            "-b:v", "0",
+            "-rc-lookahead", "0",
+            "-spatial_aq", "0",
+        ])
+    else:
+        cmd.extend([
+            "-c:v", "libx264",
+            "-preset", settings.X264_PRESET,
+            "-crf", str(settings.X264_CRF),
+        ])
+        if settings.X264_TUNE:
+            cmd.extend(["-tune", settings.X264_TUNE])
+
+    if encoder == "cuda":
+        # scale_npp converte para yuv420p na própria GPU
+        cmd.extend(["-vf", "fps=60:round=near,scale_npp=format=yuv420p"])
+    else:
+        cmd.extend(["-vf", "fps=60:round=near", "-pix_fmt", "yuv420p"])
+
     # Encoding 60 FPS de alta qualidade
     cmd.extend([
-        "-c:v", "libx264",
         "-c:a", "aac",
-        "-vf", "fps=60",        # 60 FPS constante
-        "-pix_fmt", "yuv420p",
-        "-preset", "slow",
-        "-crf", "18",
         "-g", "60",             # Keyframe a cada 1 segundo (60 frames)
-        "-bf", "2",
+        "-bf", "0",             # Sem B-frames: menos lookahead/estimativa de movimento
+        "-r", "60",             # 60 FPS constantes na saída
         "-movflags", "+faststart",
-        output_path
     ])
-    
+    return cmd
+
+
+async def _load_page(page, html_content: str) -> None:
+    """Carrega o HTML e espera imagem principal, frames e fontes ficarem prontos."""
+    # Garante fundo preto antes de carregar
+    await page.add_style_tag(content="html, body { background-color: #000 !important; }")
+
+    # HTML carregado direto na página (todos os assets do template são URLs absolutas).
+    # "load" basta: imagem principal e fontes são aguardadas explicitamente abaixo
+    await page.set_content(html_content, wait_until="load")
+
+    # Aguarda imagem principal carregar completamente
+    await page.wait_for_function("""
+        () => {
+            const img = document.querySelector('.avatar-main');
+            return img && img.complete && img.naturalWidth > 0;
+        }
+    """, timeout=10000)
+
+    # Aguarda conteúdo estar visível (instant-visible ou active)
+    await page.wait_for_selector('.frame.instant-visible, .frame.active', state='visible', timeout=5000)
+
+    # Aguarda fontes carregarem
+    await page.wait_for_function("document.fonts.ready.then(() => true)", timeout=5000)
+
+    # Aguarda um pouco mais para garantir que o primeiro frame está completamente renderizado
+    await page.wait_for_timeout(300)
+
+
+async def _record_video(html_content: str, raw_video_path: str, width: int, height: int, duration: int) -> None:
+    """FASE 1: grava a animação do HTML com o Playwright em raw_video_path."""
+    output_dir = os.path.dirname(raw_video_path)
+
+    context = await renderer_pool.acquire(output_dir, width, height)
     try:
-        # Log do comando para debug
-        logger.info(f"🔧 FFmpeg comando: {' '.join(cmd)}")
-
-        # Roda o comando e captura erros
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        logger.info(f"✅ Vídeo final pronto: {output_path}")
-        
-        # Limpa arquivos temporários
-        if os.path.exists(raw_video_path): os.remove(raw_video_path)
-        if os.path.exists(temp_html_path): os.remove(temp_html_path)
-        
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Erro no FFmpeg: {e}")
-        logger.error(f"FFmpeg stderr: {e.stderr if hasattr(e, 'stderr') else 'N/A'}")
-        # Se falhar, entrega o vídeo cru
+        page = await context.new_page()
+        try:
+            await _load_page(page, html_content)
+
+            # Grava a duração completa
+            await page.wait_for_timeout(duration)
+        finally:
+            # Fechar a página finaliza a gravação do vídeo (o contexto continua vivo)
+            await page.close()
+
+        # Move o vídeo cru para o nome esperado
+        video_obj = page.video
+        if video_obj:
+            if os.path.exists(raw_video_path): os.remove(raw_video_path)
+            await video_obj.save_as(raw_video_path)
+            await video_obj.delete()
+    finally:
+        # Devolve o contexto ao pool mesmo em caso de erro
+        await renderer_pool.release(context, output_dir, width, height)
+
+
+# Modo screencast: frames JPEG enviados pelo Chromium (CDP) direto para o FFmpeg
+_SCREENCAST_FPS = 60
+_SCREENCAST_JPEG_QUALITY = 90
+
+
+async def _capture_screencast(
+    html_content: str, output_path: str, audio_path: str, width: int, height: int, duration: int
+) -> str:
+    """
+    Grava e codifica em uma única passada: os frames do Page.startScreencast
+    vão para o stdin do FFmpeg (image2pipe), sem WebM intermediário.
+
+    O Chromium só emite frame quando a tela muda, então cada frame é repetido
+    até o timestamp do seguinte para manter a linha do tempo em 60 FPS.
+    """
+    ffmpeg_exe = get_ffmpeg_path()
+    if not ffmpeg_exe:
+        raise RuntimeError("FFmpeg não encontrado - necessário no modo screencast")
+
+    # Sem retry possível (os frames são consumidos): NVENC só se já funcionou neste processo
+    encoder = "h264_nvenc" if _NVENC_CONFIRMED and _HAS_NVENC else "libx264"
+    input_args = ["-f", "image2pipe", "-c:v", "mjpeg", "-framerate", str(_SCREENCAST_FPS), "-i", "-"]
+    cmd = _build_ffmpeg_cmd(ffmpeg_exe, input_args, audio_path, output_path, encoder)
+    logger.info(f"🔧 FFmpeg comando: {' '.join(cmd)}")
+
+    context = await renderer_pool.acquire(None, width, height)
+    try:
+        page = await context.new_page()
+        try:
+            await _load_page(page, html_content)
+
+            cdp = await context.new_cdp_session(page)
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+            # stderr drenado em paralelo para o FFmpeg não travar com o pipe cheio
+            stderr_task = asyncio.create_task(proc.stderr.read())
+            frames: asyncio.Queue = asyncio.Queue()
+
+            def on_frame(params):
+                frames.put_nowait((params["metadata"]["timestamp"], params["data"]))
+                asyncio.create_task(cdp.send("Page.screencastFrameAck", {"sessionId": params["sessionId"]}))
+
+            async def pump():
+                total = duration * _SCREENCAST_FPS // 1000
+                first_ts, last, written = None, None, 0
+                try:
+                    while True:
+                        item = await frames.get()
+                        if item is None:
+                            break
+                        ts, data = item
+                        if first_ts is None:
+                            first_ts = ts
+                        due = min(int((ts - first_ts) * _SCREENCAST_FPS), total)
+                        while last is not None and written < due:
+                            proc.stdin.write(last)
+                            written += 1
+                        last = base64.b64decode(data)
+                        await proc.stdin.drain()
+                    # Completa a duração com o último frame
+                    while last is not None and written < total:
+                        proc.stdin.write(last)
+                        written += 1
+                    await proc.stdin.drain()
+                    proc.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    # FFmpeg saiu antes do fim: o erro reportado é o stderr/código de saída dele
+                    logger.warning("FFmpeg fechou o stdin durante o screencast")
+
+            cdp.on("Page.screencastFrame", on_frame)
+            pump_task = asyncio.create_task(pump())
+            try:
+                await cdp.send("Page.startScreencast", {
+                    "format": "jpeg",
+                    "quality": _SCREENCAST_JPEG_QUALITY,
+                    "maxWidth": width,
+                    "maxHeight": height,
+                    "everyNthFrame": 1,
+                })
+                await page.wait_for_timeout(duration)
+                await cdp.send("Page.stopScreencast")
+            finally:
+                frames.put_nowait(None)
+                await pump_task
+                stderr = await stderr_task
+                await proc.wait()
+                await cdp.detach()
+        finally:
+            await page.close()
+    finally:
+        await renderer_pool.release(context, None, width, height)
+
+    if proc.returncode != 0:
+        logger.error(f"FFmpeg stderr: {stderr.decode(errors='replace')}")
+        raise RuntimeError(f"Erro no FFmpeg ({encoder}): código de saída {proc.returncode}")
+
+    logger.info(f"✅ Vídeo final pronto: {output_path}")
+    return output_path
+
+
+async def _available_encoders(ffmpeg_exe: str) -> list:
+    """Pipeline CUDA/NVENC quando disponíveis; libx264 sempre como último recurso."""
+    encoders = ["libx264"]
+    if await asyncio.to_thread(_check_nvenc_available, ffmpeg_exe):
+        encoders.insert(0, "h264_nvenc")
+        if await asyncio.to_thread(_check_cuda_pipeline_available, ffmpeg_exe):
+            encoders.insert(0, "cuda")
+    return encoders
+
+
+def _disable_encoder(encoder: str) -> None:
+    """Encoder de GPU falhou onde outro encoder deu certo com o mesmo vídeo: não tenta mais nesse processo."""
+    global _HAS_NVENC, _HAS_CUDA_PIPELINE
+    if encoder == "cuda":
+        _HAS_CUDA_PIPELINE = False
+    elif encoder == "h264_nvenc":
+        _HAS_NVENC = False
+
+
+def _confirm_encoder(encoder: str) -> None:
+    """Encode concluído: a GPU funciona de fato (libera NVENC para o modo screencast)."""
+    global _NVENC_CONFIRMED
+    if encoder in ("cuda", "h264_nvenc"):
+        _NVENC_CONFIRMED = True
+
+
+async def _run_ffmpeg(cmd: list, encoder: str) -> bool:
+    """Roda o FFmpeg sem bloquear o loop; loga o stderr e retorna False em caso de erro."""
+    # Log do comando para debug
+    logger.info(f"🔧 FFmpeg comando: {' '.join(cmd)}")
+
+    # Processo assíncrono: o loop segue gravando outros vídeos durante o encode
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await proc.communicate()
+
+    if proc.returncode != 0:
+        logger.error(f"Erro no FFmpeg ({encoder}): código de saída {proc.returncode}")
+        logger.error(f"FFmpeg stderr: {stderr.decode(errors='replace')}")
+        return False
+    return True
+
+
+async def _encode_video(raw_video_path: str, audio_path: str, output_path: str) -> str:
+    """FASE 2: pós-processamento com FFmpeg (áudio + H.264) sem bloquear o event loop."""
+    ffmpeg_exe = get_ffmpeg_path()
+    
+    if not ffmpeg_exe:
+        logger.error("FFmpeg não encontrado! O vídeo ficará sem áudio e pode não funcionar no WhatsApp.")
+        if os.path.exists(output_path): os.remove(output_path)
+        os.rename(raw_video_path, output_path)
+        return output_path
+
+    # Encode carrega o vídeo cru inteiro; espera a memória baixar antes de gravar
+    if not await wait_for_memory_async(settings.MEMORY_WRITE_THRESHOLD, settings.MEMORY_WAIT_TIMEOUT):
+        logger.warning(f"Memória acima de {settings.MEMORY_WRITE_THRESHOLD}% - gravando mesmo assim")
+
+    logger.info("🎵 Adicionando áudio e convertendo para WhatsApp...")
+
+    # Pipeline CUDA/NVENC quando disponíveis; libx264 como fallback (inclusive se a GPU falhar)
+    failed = []
+    for encoder in await _available_encoders(ffmpeg_exe):
+        cmd = _build_ffmpeg_cmd(ffmpeg_exe, _raw_video_input(raw_video_path), audio_path, output_path, encoder)
+        if await _run_ffmpeg(cmd, encoder):
+            logger.info(f"✅ Vídeo final pronto: {output_path}")
+            _confirm_encoder(encoder)
+
+            # O mesmo vídeo passou em outro encoder: a falha anterior foi da GPU, não da entrada
+            for failed_encoder in failed:
+                _disable_encoder(failed_encoder)
+
+            # Limpa arquivos temporários
+            if os.path.exists(raw_video_path): os.remove(raw_video_path)
+            break
+
+        failed.append(encoder)
+    else:
+        # Se todos falharem, entrega o vídeo cru
         if os.path.exists(raw_video_path):
             os.rename(raw_video_path, output_path)
 
-    return output_path
\ No newline at end of file
+    return output_path
+
+
+async def _encode_batch(jobs: list) -> list:
+    """
+    Codifica vários vídeos crus em um único processo FFmpeg (N entradas, N saídas),
+    amortizando a abertura do processo e dos encoders.
+
+    jobs: lista de (raw_video_path, audio_path, output_path). Se o lote falhar,
+    cada vídeo é refeito individualmente por _encode_video.
+    """
+    ffmpeg_exe = get_ffmpeg_path()
+    if ffmpeg_exe:
+        if not await wait_for_memory_async(settings.MEMORY_WRITE_THRESHOLD, settings.MEMORY_WAIT_TIMEOUT):
+            logger.warning(f"Memória acima de {settings.MEMORY_WRITE_THRESHOLD}% - gravando mesmo assim")
+
+        encoder = (await _available_encoders(ffmpeg_exe))[0]
+        cmd = [ffmpeg_exe, "-y"]
+        outputs = []
+        index = 0
+        for raw_video_path, audio_path, output_path in jobs:
+            if encoder == "cuda":
+                cmd.extend(["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"])
+            cmd.extend(_raw_video_input(raw_video_path))
+            maps = ["-map", f"{index}:v:0"]
+            index += 1
+            if audio_path:
+                cmd.extend(["-i", audio_path])
+                maps.extend(["-map", f"{index}:a:0", "-shortest"])
+                index += 1
+            outputs.extend(maps + _output_args(encoder) + [output_path])
+        cmd.extend(outputs)
+
+        logger.info(f"🎵 Convertendo lote de {len(jobs)} vídeos em um único FFmpeg...")
+        if await _run_ffmpeg(cmd, encoder):
+            _confirm_encoder(encoder)
+            for raw_video_path, _, output_path in jobs:
+                logger.info(f"✅ Vídeo final pronto: {output_path}")
+                if os.path.exists(raw_video_path): os.remove(raw_video_path)
+            return [output_path for _, _, output_path in jobs]
+
+        # Não desativa o encoder aqui: um clipe ruim derruba o lote inteiro;
+        # o fallback por vídeo em _encode_video decide se a culpa é da GPU
+        logger.warning("Lote falhou - convertendo os vídeos um a um")
+
+    return [await _encode_video(*job) for job in jobs]
+
+
+# Estágios do render no loop de render: gravações limitadas por semáforo e
+# encodes consumidos de uma fila, assim o próximo vídeo já começa a gravar
+# enquanto o FFmpeg processa o anterior
+_record_slots = None
+_encode_queue = None
+_encode_workers = []
+
+
+def _get_render_stages():
+    global _record_slots, _encode_queue
+    if _encode_queue is None:
+        _record_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_RENDERS)
+        _encode_queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        for _ in range(max(1, settings.MAX_CONCURRENT_ENCODES)):
+            _encode_workers.append(loop.create_task(_encode_worker(_encode_queue)))
+    return _record_slots, _encode_queue
+
+
+async def _encode_worker(queue: asyncio.Queue) -> None:
+    while True:
+        # Com fila acumulada, junta até ENCODE_BATCH_SIZE vídeos em um único FFmpeg
+        batch = [await queue.get()]
+        while len(batch) < settings.ENCODE_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+        jobs = [item[:3] for item in batch]
+        futures = [item[3] for item in batch]
+        try:
+            if len(jobs) > 1:
+                results = await _encode_batch(jobs)
+            else:
+                results = [await _encode_video(*jobs[0])]
+            for future, result in zip(futures, results):
+                if not future.done(): future.set_result(result)
+        except Exception as e:
+            for future in futures:
+                if not future.done(): future.set_exception(e)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+
+async def render_video(
+    html_content: str, 
+    output_path: str, 
+    audio_path: str = None,
+    width: int = 1080, 
+    height: int = 1920, 
+    duration: int = 15000
+) -> str:
+    
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    raw_video_path = os.path.join(output_dir, f"raw_{os.path.basename(output_path)}") # Vídeo sem áudio
+    
+    logger.info(f"🎥 Renderizando visual...")
+    # Valida o áudio uma única vez; daqui em diante audio_path None significa "sem áudio"
+    if audio_path and not os.path.exists(audio_path):
+        logger.warning(f"🎵 Áudio não encontrado, vídeo sairá sem som: {audio_path}")
+        audio_path = None
+    logger.info(f"🎵 Áudio selecionado: {audio_path}")
+
+    record_slots, encode_queue = _get_render_stages()
+
+    if settings.RENDER_CAPTURE_MODE == "screencast":
+        # Captura e encode na mesma etapa (sem vídeo cru para a fila de encode)
+        async with record_slots:
+            return await _capture_screencast(html_content, output_path, audio_path, width, height, duration)
+
+    # --- FASE 1: GRAVAÇÃO (PLAYWRIGHT) ---
+    async with record_slots:
+        await _record_video(html_content, raw_video_path, width, height, duration)
+
+    # --- FASE 2: PÓS-PROCESSAMENTO (FFMPEG) ---
+    # Libera a vaga de gravação antes do encode; o resultado chega pela future
+    future = asyncio.get_running_loop().create_future()
+    await encode_queue.put((raw_video_path, audio_path, output_path, future))
+    return await future
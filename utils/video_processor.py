@@ -1,15 +1,23 @@
 import os
+import asyncio
+import threading
+import time
 import uuid
 import logging
-import asyncio
 import random
+import shutil
 import glob
 import json
+import functools
+import itertools
 import requests
+import httpx
+import orjson
 from datetime import datetime
-from typing import Dict, Any, Optional
-from jinja2 import Environment, FileSystemLoader
-from .renderer import render_video
+from typing import Dict, Any, List, Optional, Tuple
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+from .renderer import render_video, run_in_render_loop, await_in_render_loop
+from .render_workers import get_render_process_pool
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -60,84 +68,170 @@ LOCALES = {
         "brand": "THRONECLASH GLOBAL"
     }
 }
+# Região desconhecida usa os textos BR
+_DEFAULT_LOCALE = LOCALES["BR"]
+
+# Formatação de valores (sem símbolo; o template exibe R$/$): BR troca , e . numa passada só
+_BR_TRANS = str.maketrans({",": ".", ".": ","})
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_currency(amount: float, region: str) -> str:
+    """Formata dinheiro: R$ 1.000,00 (BR) ou $ 1,000.00 (Global). Valores repetidos vêm do cache."""
+    formatted = f"{amount:,.2f}"
+    return formatted.translate(_BR_TRANS) if region == "BR" else formatted
+
+
+# Ambiente Jinja compartilhado: templates compilados ficam em memória (sem
+# checar o disco a cada render) e o bytecode em cache entre reinícios
+_BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+# Resolvido uma vez no import: templates/ do projeto, ou do diretório atual como fallback
+_TEMPLATE_DIR = os.path.join(_BASE_DIR, "templates")
+if not os.path.isdir(_TEMPLATE_DIR):
+    _TEMPLATE_DIR = os.path.join(os.getcwd(), "templates")
+_TEMPLATE_NAME = "template_dynamic_new.html"
+# Duração fixa: o template distribui os frames ativos (f1..f4) sempre em 12s,
+# então não depende de dethroned_name/victims. 12s + 1s margem + 0.5s de trim inicial
+_RENDER_DURATION_MS = 12000 + 1000 + 500
+
+_TEMPLATE_ENV = Environment(
+    loader=FileSystemLoader(_TEMPLATE_DIR),
+    auto_reload=False,
+    cache_size=-1,          # Nunca descarta templates compilados
+    # Sem diretório fixo: o padrão do Jinja usa uma pasta por usuário (0700, dono verificado)
+    bytecode_cache=FileSystemBytecodeCache()
+)
+
+# Compila o template já no import (warmup), não no primeiro request
+_TEMPLATES: Dict[str, Template] = {}
+try:
+    _TEMPLATES[_TEMPLATE_NAME] = _TEMPLATE_ENV.get_template(_TEMPLATE_NAME)
+except Exception as e:
+    logger.warning(f"Não foi possível pré-carregar {_TEMPLATE_NAME}: {e}")
+
 
 class VideoProcessor:
     def __init__(self, output_dir: str = "./output"):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         
-        base_dir = os.path.dirname(os.path.dirname(__file__))
-        self.assets_dir = os.path.join(base_dir, "assets")
-        template_dir = os.path.join(base_dir, "templates")
+        self.assets_dir = os.path.join(_BASE_DIR, "assets")
         
         os.makedirs(self.assets_dir, exist_ok=True)
-        if not os.path.exists(template_dir): template_dir = os.path.join(os.getcwd(), "templates")
-        self.template_env = Environment(loader=FileSystemLoader(template_dir))
-
-    def _get_random_music(self) -> Optional[str]:
-        mp3_files = glob.glob(os.path.join(self.assets_dir, "*.mp3"))
+        self.template_env = _TEMPLATE_ENV
+        self._templates = _TEMPLATES
+        # Template principal resolvido uma vez (None se o warmup falhou; tenta de novo no render)
+        self.template = self._templates.get(_TEMPLATE_NAME)
+
+        # Lista de músicas em cache (relida só se o diretório mudar); sem nenhuma, baixa o fallback em background
+        self._music_lock = threading.Lock()
+        self._scan_music()
         logger.info(f"🔍 Diretório de assets: {self.assets_dir}")
-        logger.info(f"🎵 Arquivos MP3 encontrados: {len(mp3_files)}")
-        if mp3_files:
-            selected = random.choice(mp3_files)
-            logger.info(f"🎵 Música selecionada: {selected}")
-            return selected
-        
-        # Fallback
-        backup_url = "https://cdn.pixabay.com/download/audio/2022/03/15/audio_14578d6b8e.mp3?filename=cinematic.mp3"
-        dest = os.path.join(self.assets_dir, "default_epic.mp3")
+        logger.info(f"🎵 Arquivos MP3 encontrados: {len(self._mp3_files)}")
+        if not self._mp3_files:
+            threading.Thread(target=self._download_fallback_music, name="music-fallback", daemon=True).start()
+
+    def _scan_music(self) -> None:
+        self._mp3_mtime = os.stat(self.assets_dir).st_mtime
+        self._set_music(glob.glob(os.path.join(self.assets_dir, "*.mp3")))
+
+    def _set_music(self, files: List[str]) -> None:
+        # Ordem embaralhada uma vez e percorrida em ciclo: todas as músicas tocam antes de repetir
+        self._mp3_files = files
+        shuffled = random.sample(files, len(files))
+        self._mp3_iter = itertools.cycle(shuffled)
+
+    def _refresh_music(self) -> None:
+        """Relê a lista de mp3 se arquivos foram adicionados/removidos em assets/."""
         try:
-            with open(dest, 'wb') as f: f.write(requests.get(backup_url).content)
-            return dest
-        except: return None
+            if os.stat(self.assets_dir).st_mtime != self._mp3_mtime:
+                self._scan_music()
+                logger.info(f"🎵 Assets alterados, MP3 encontrados: {len(self._mp3_files)}")
+        except OSError as e:
+            logger.warning(f"Não foi possível verificar {self.assets_dir}: {e}")
+
+    def _download_fallback_music(self) -> None:
+        """Baixa a música padrão (uma vez; chamadas concorrentes esperam a primeira)."""
+        with self._music_lock:
+            if self._mp3_files:
+                return
+            backup_url = "https://cdn.pixabay.com/download/audio/2022/03/15/audio_14578d6b8e.mp3?filename=cinematic.mp3"
+            dest = os.path.join(self.assets_dir, "default_epic.mp3")
+            for attempt in range(1, 4):
+                try:
+                    # Stream direto para um arquivo temporário: memória constante e nunca
+                    # deixa um mp3 pela metade nos assets
+                    with requests.get(backup_url, stream=True, timeout=(5, 30)) as r, open(dest + ".part", 'wb') as f:
+                        r.raise_for_status()
+                        r.raw.decode_content = True
+                        shutil.copyfileobj(r.raw, f, length=64 * 1024)
+                    os.replace(dest + ".part", dest)
+                    self._set_music([dest])
+                    return
+                except Exception as e:
+                    logger.warning(f"Falha ao baixar música padrão (tentativa {attempt}/3): {e}")
+                    if attempt < 3:
+                        time.sleep(attempt)
 
-    def _format_currency(self, amount: float, region: str) -> str:
-        """Formata dinheiro: R$ 1.000,00 (BR) ou $ 1,000.00 (Global)"""
-        if region == "BR":
-            return f"{amount:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        else:
-            return f"{amount:,.2f}"
+    def _get_random_music(self) -> Optional[str]:
+        if not self._mp3_files:
+            return None
+        selected = next(self._mp3_iter)
+        logger.info(f"🎵 Música selecionada: {selected}")
+        return selected
 
     def process_video(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Versão síncrona: agenda process_video_async no loop de render compartilhado."""
+        return run_in_render_loop(self.process_video_async(params))
+
+    async def process_video_async(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Renderiza o vídeo; pode ser aguardada de qualquer event loop."""
         logger.info("Iniciando renderização Dinâmica...")
 
-        video_id = str(uuid.uuid4())
+        video_id = uuid.uuid4().hex
         region = params.get("region", "BR").upper()
         filename = f"{region.lower()}_{video_id}.mp4"
         output_path = os.path.join(self.output_dir, filename)
 
-        # 1. Música aleatória
+        # 1. Música aleatória (se o fallback ainda não foi baixado, tenta fora do loop)
+        self._refresh_music()
+        if not self._mp3_files:
+            await asyncio.to_thread(self._download_fallback_music)
         audio_path = self._get_random_music()
-        texts = LOCALES.get(region, LOCALES["BR"])
+        texts = LOCALES.get(region, _DEFAULT_LOCALE)
 
         # 2. Preparar Contexto (dados do backend)
-        context = params.copy()
-        context["region"] = region
-        context["labels"] = texts
+        # Jinja monta um dict do contexto de qualquer forma: um dict simples é o caminho mais barato
+        context = {**params, "region": region, "labels": texts}
 
         # 3. Renderizar
         try:
-            template = self.template_env.get_template("template_dynamic_new.html")
-            html_content = template.render(**context)
-
-            # Duração fixa de 12 segundos + margem para trim e segurança
-            # Template agora calcula automaticamente a timeline baseado nos frames ativos
-            duration = 13500  # 12s de conteúdo + 1s margem + 0.5s para trim inicial
+            if self.template is None:
+                self.template = self.template_env.get_template(_TEMPLATE_NAME)
+            html_content = self.template.render(context)
 
+            duration = _RENDER_DURATION_MS
             logger.info(f"Renderizando [{region}] {duration}ms -> {output_path}")
 
-            asyncio.run(render_video(
+            render_kwargs = dict(
                 html_content=html_content,
                 output_path=output_path,
                 audio_path=audio_path,
                 width=1080, height=1920,
                 duration=duration
-            ))
+            )
+            if settings.RENDER_PROCESSES > 0:
+                # Render em um processo separado (GIL, loop e Chromium próprios)
+                await asyncio.wrap_future(get_render_process_pool().submit(**render_kwargs))
+            else:
+                # O pool de browsers vive no loop de render; de outro loop, agenda lá
+                await await_in_render_loop(render_video(**render_kwargs))
 
             status = "completed"
             error = None
         except Exception as e:
-            logger.error(f"Erro Fatal: {e}", exc_info=True)
+            # Formatação lazy; traceback completo só com DEBUG (o erro vai no payload salvo)
+            logger.error("Erro Fatal: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             status = "failed"
             error = str(e)
             # Salva payload para debug em caso de erro de renderização
@@ -152,7 +246,7 @@ class VideoProcessor:
 
         # Formata amount para exibição
         raw_amount = float(params.get("amount", 0))
-        formatted_amount = self._format_currency(raw_amount, region)
+        formatted_amount = _format_currency(round(raw_amount, 2), region)
 
         return {
             "video_id": video_id,
@@ -165,14 +259,117 @@ class VideoProcessor:
             "original_params": params
         }
 
+# Upload resumível do Instagram: blocos de tamanho fixo, cada um retentado a partir do offset confirmado
+_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+_UPLOAD_MAX_RETRIES = 3
+
+# Hashtags da legenda por região (região desconhecida usa BR)
+_CAPTION_SUFFIX = {
+    "GLOBAL": "\n\n#throneclash #crypto #game #winner",
+    "BR": "\n\n#throneclash #ganhador #leilao #pix",
+}
+
+
 class InstagramPublisher:
     def __init__(self):
-        # Não iniciamos credenciais fixas aqui, decidimos no momento do envio
+        # Pares (token, account_id) por região; None quando a região não está configurada
+        self._creds: Dict[str, Optional[Tuple[str, str]]] = {
+            "GLOBAL": settings.INSTAGRAM_CREDS_GLOBAL,
+            "BR": settings.INSTAGRAM_CREDS_BR,
+        }
         self.last_error = None
 
-    def publish_video(self, video_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Cliente com keep-alive: init/upload/status/publish reaproveitam a conexão TLS.
+        # Criado no primeiro uso, dentro do event loop que vai usá-lo
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(
+                    retries=3,
+                    limits=httpx.Limits(max_connections=8, max_keepalive_connections=4)
+                ),
+                headers={"User-Agent": "throneclash/1.0"},
+                # connect curto: endpoint fora do ar falha rápido em vez de segurar o job
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return self._client
+
+    async def _upload_resumable(self, uri: str, path: str, file_size: int, graph_api: str, creation_id: str, access_token: str) -> Optional[str]:
+        """
+        Envia o vídeo em blocos de _UPLOAD_CHUNK_SIZE com os headers offset/file_size.
+        Em erro 5xx ou de rede, consulta quantos bytes o Instagram já recebeu e retoma dali.
+        Retorna None em caso de sucesso, ou a mensagem de erro.
         """
-        Publica vídeo no Instagram.
+        offset = 0
+        failures = 0
+        with open(path, 'rb') as f:
+            while offset < file_size:
+                f.seek(offset)
+                chunk = await asyncio.to_thread(f.read, _UPLOAD_CHUNK_SIZE)
+                try:
+                    res = await self.client.post(uri, content=chunk, headers={
+                        "Authorization": f"OAuth {access_token}",
+                        "offset": str(offset), "file_size": str(file_size)
+                    })
+                except httpx.HTTPError as e:
+                    res, detail = None, str(e)
+                else:
+                    if res.status_code == 200:
+                        offset += len(chunk)
+                        failures = 0
+                        continue
+                    if res.status_code < 500:
+                        return f"Erro Upload: {res.text}"
+                    detail = res.text
+
+                failures += 1
+                if failures > _UPLOAD_MAX_RETRIES:
+                    return f"Erro Upload: {detail}"
+                logger.warning(f"Upload falhou no offset {offset} ({detail}) - tentativa {failures}/{_UPLOAD_MAX_RETRIES}")
+                await asyncio.sleep(failures)
+                offset = await self._uploaded_bytes(graph_api, creation_id, access_token, default=offset)
+        return None
+
+    async def _uploaded_bytes(self, graph_api: str, creation_id: str, access_token: str, default: int) -> int:
+        """Bytes já recebidos pelo Instagram (video_status.uploading_phase), ou `default` se não der para consultar."""
+        try:
+            res = await self.client.get(f"{graph_api}/{creation_id}", params={
+                "fields": "video_status",
+                "access_token": access_token
+            })
+            return int(orjson.loads(res.content)["video_status"]["uploading_phase"]["bytes_transferred"])
+        except Exception:
+            return default
+
+    async def _wait_for_container(self, graph_api: str, creation_id: str, access_token: str) -> Optional[str]:
+        """
+        Consulta o status_code do container até FINISHED, com backoff exponencial (1s, 2s, 4s, 8s...).
+        Retorna None quando pronto, ou a mensagem de erro (ERROR/EXPIRED/timeout).
+        """
+        deadline = time.monotonic() + settings.INSTAGRAM_PUBLISH_TIMEOUT
+        delay = 1.0
+        while True:
+            res = await self.client.get(f"{graph_api}/{creation_id}", params={
+                "fields": "status_code",
+                "access_token": access_token
+            })
+            status = orjson.loads(res.content).get("status_code") if res.status_code == 200 else None
+            if status == "FINISHED":
+                return None
+            if status in ("ERROR", "EXPIRED"):
+                return f"Erro Processamento: container {status}"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return f"Erro Processamento: container não ficou pronto em {settings.INSTAGRAM_PUBLISH_TIMEOUT}s (status={status})"
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 8.0)
+
+    async def publish_video(self, video_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Publica vídeo no Instagram (assíncrono: vários uploads compartilham o mesmo loop).
         Retorna dict com: success (bool), error (str ou None), published_id (str ou None)
         """
         path = video_data.get("video_path")
@@ -180,64 +377,64 @@ class InstagramPublisher:
         self.last_error = None
 
         # Seleciona Credenciais baseadas na região
-        if region == "GLOBAL":
-            access_token = settings.INSTAGRAM_ACCESS_TOKEN_GLOBAL
-            account_id = settings.INSTAGRAM_ACCOUNT_ID_GLOBAL
-        else:
-            access_token = settings.INSTAGRAM_ACCESS_TOKEN_BR
-            account_id = settings.INSTAGRAM_ACCOUNT_ID_BR
-
-        if not access_token or not account_id:
+        creds = self._creds.get(region, self._creds["BR"])
+        if not creds:
             self.last_error = f"Credenciais não encontradas para região {region}"
             logger.error(f"❌ {self.last_error}")
             return {"success": False, "error": self.last_error, "published_id": None}
+        access_token, account_id = creds
 
-        if not path or not os.path.exists(path):
+        # Um único stat: confirma que o arquivo existe e já traz o tamanho para o upload
+        try:
+            file_size = os.stat(path).st_size
+        except (OSError, TypeError):
             self.last_error = f"Arquivo de vídeo não encontrado: {path}"
             logger.error(f"❌ {self.last_error}")
             return {"success": False, "error": self.last_error, "published_id": None}
 
-        base_api = f"https://graph.facebook.com/v18.0/{account_id}"
+        graph_api = "https://graph.facebook.com/v18.0"
+        base_api = f"{graph_api}/{account_id}"
         video_api = f"https://graph-video.facebook.com/v18.0/{account_id}"
 
         try:
             # 1. Init
             logger.info(f"Iniciando upload para Instagram [{region}]...")
-            res = requests.post(f"{video_api}/media?upload_type=resumable&media_type=REELS",
+            res = await self.client.post(f"{video_api}/media?upload_type=resumable&media_type=REELS",
                               headers={"Authorization": f"Bearer {access_token}"})
             if res.status_code != 200:
                 self.last_error = f"Erro Init: {res.text}"
                 logger.error(self.last_error)
                 return {"success": False, "error": self.last_error, "published_id": None}
 
-            uri = res.json().get("uri")
-            creation_id = res.json().get("id")
+            data = orjson.loads(res.content)
+            uri = data.get("uri")
+            creation_id = data.get("id")
 
-            # 2. Upload
-            with open(path, 'rb') as f:
-                requests.post(uri, data=f, headers={
-                    "Authorization": f"OAuth {access_token}",
-                    "offset": "0", "file_size": str(os.path.getsize(path))
-                })
+            # 2. Upload (em blocos: memória constante e retomada em caso de falha)
+            error = await self._upload_resumable(uri, path, file_size, graph_api, creation_id, access_token)
+            if error:
+                self.last_error = error
+                logger.error(f"❌ {self.last_error}")
+                return {"success": False, "error": self.last_error, "published_id": None}
 
-            # 3. Publish
-            import time
-            time.sleep(15)
+            # 3. Aguarda o Instagram terminar de processar o container
+            error = await self._wait_for_container(graph_api, creation_id, access_token)
+            if error:
+                self.last_error = error
+                logger.error(f"❌ {self.last_error}")
+                return {"success": False, "error": self.last_error, "published_id": None}
 
-            caption = f"👑 {video_data.get('king_name')} - {video_data.get('amount')}"
-            if region == "GLOBAL":
-                caption += "\n\n#throneclash #crypto #game #winner"
-            else:
-                caption += "\n\n#throneclash #ganhador #leilao #pix"
+            # 4. Publish
+            caption = f"👑 {video_data.get('king_name')} - {video_data.get('amount')}" + _CAPTION_SUFFIX.get(region, _CAPTION_SUFFIX["BR"])
 
-            pub = requests.post(f"{base_api}/media_publish", params={
+            pub = await self.client.post(f"{base_api}/media_publish", params={
                 "creation_id": creation_id,
                 "caption": caption,
                 "access_token": access_token
             })
 
             if pub.status_code == 200:
-                published_id = pub.json().get('id')
+                published_id = orjson.loads(pub.content).get('id')
                 logger.info(f"✅ Publicado no IG {region}! ID: {published_id}")
                 return {"success": True, "error": None, "published_id": published_id}
             else:
@@ -0,0 +1,165 @@
+"""
+Worker entrypoint for video processing jobs.
+
+Jobs are enqueued by the API into the Redis queue (settings.RQ_QUEUE_NAME)
+and executed here, outside of the API event loop:
+
+    python worker.py
+
+Without REDIS_URL the API awaits process_video_job in-process through
+BackgroundTasks, without holding a threadpool thread for the whole render.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.job_queue import job_queue, JobStatus
+from utils.video_processor import VideoProcessor, InstagramPublisher, delete_video_file, save_payload_log
+from utils.memory import wait_for_memory_async
+from utils.renderer import run_in_render_loop, warmup_renderer
+
+logger = logging.getLogger(__name__)
+
+settings.ensure_output_dir()
+
+# Criados no primeiro job: `python worker.py` roda este arquivo como __main__ e o RQ
+# importa "worker" de novo para os jobs, então nada pesado pode nascer no import
+_video_processor: Optional[VideoProcessor] = None
+_instagram_publisher: Optional[InstagramPublisher] = None
+_services_lock = threading.Lock()
+
+
+def _get_services() -> Tuple[VideoProcessor, InstagramPublisher]:
+    """VideoProcessor e InstagramPublisher compartilhados pelos jobs deste processo."""
+    global _video_processor, _instagram_publisher
+    with _services_lock:
+        if _video_processor is None:
+            _video_processor = VideoProcessor(output_dir=settings.VIDEO_OUTPUT_DIR)
+            _instagram_publisher = InstagramPublisher()
+    return _video_processor, _instagram_publisher
+
+
+def process_video_background(job_id: str, template: str, params: dict) -> None:
+    """Entrada síncrona (jobs do RQ): roda process_video_job no loop de render compartilhado."""
+    run_in_render_loop(process_video_job(job_id, template, params))
+
+
+async def process_video_job(job_id: str, template: str, params: dict) -> None:
+    """
+    Processa vídeo em background com controle de flags:
+    - persist_file: Se False (padrão), deleta o arquivo após processamento
+    - publish_instagram: Se True (padrão), tenta publicar no Instagram
+    """
+    video_path = None
+    persist_file = params.get("persist_file", False)
+    publish_instagram = params.get("publish_instagram", True)
+
+    try:
+        video_processor, instagram_publisher = _get_services()
+        logger.info(f"Starting job {job_id}")
+        logger.info(f"Flags: persist_file={persist_file}, publish_instagram={publish_instagram}")
+        job_queue.update_job_status(job_id, JobStatus.PROCESSING)
+
+        # 1. Renderiza o vídeo (aguarda memória livre antes de abrir o Chromium)
+        if not await wait_for_memory_async(settings.MEMORY_RENDER_THRESHOLD, settings.MEMORY_WAIT_TIMEOUT):
+            raise RuntimeError(f"Memória acima de {settings.MEMORY_RENDER_THRESHOLD}% por {settings.MEMORY_WAIT_TIMEOUT}s")
+
+        video_data = await video_processor.process_video_async(params)
+        video_path = video_data.get("video_path")
+
+        # Se falhou na renderização, o arquivo já foi deletado pelo processor
+        if video_data.get("status") == "failed":
+            job_queue.update_job_status(job_id, JobStatus.FAILED, error="Erro na renderização")
+            return
+
+        job_queue.update_job_status(job_id, JobStatus.COMPLETED, result=video_data)
+
+        # 2. Publica no Instagram (se flag habilitada)
+        if publish_instagram:
+            logger.info(f"Publishing to Instagram ({video_data.get('region', 'BR')})")
+            publish_result = await instagram_publisher.publish_video(video_data)
+
+            if publish_result.get("success"):
+                video_data["instagram_id"] = publish_result.get("published_id")
+                job_queue.update_job_status(job_id, JobStatus.PUBLISHED, result=video_data)
+                # Sucesso no Instagram: deleta arquivo (a menos que persist_file=True)
+                if not persist_file:
+                    delete_video_file(video_path)
+                    logger.info(f"Vídeo publicado e arquivo deletado: {video_path}")
+            else:
+                # Falha no Instagram: salva payload e deleta arquivo
+                logger.warning(f"Failed to publish video {job_id}")
+                error_msg = publish_result.get("error", "Erro desconhecido")
+
+                # Salva payload para debug
+                save_payload_log(
+                    payload=video_data.get("original_params", params),
+                    video_id=video_data.get("video_id", job_id),
+                    error_message=error_msg
+                )
+
+                # Deleta arquivo em caso de falha de integração
+                delete_video_file(video_path)
+                logger.info(f"Falha no Instagram: payload salvo e arquivo deletado")
+
+                job_queue.update_job_status(job_id, JobStatus.FAILED, error=f"Instagram: {error_msg}")
+        else:
+            # Não publica no Instagram
+            logger.info(f"Publicação no Instagram desabilitada para job {job_id}")
+            # Se não vai publicar e persist_file=False, deleta
+            if not persist_file:
+                delete_video_file(video_path)
+                logger.info(f"Arquivo deletado (persist_file=False): {video_path}")
+
+    except asyncio.CancelledError:
+        logger.warning(f"Job {job_id} cancelado (timeout do worker)")
+        job_queue.update_job_status(job_id, JobStatus.FAILED, error="Job cancelado (timeout)")
+        if video_path:
+            delete_video_file(video_path)
+        raise
+    except Exception as e:
+        logger.error(f"Error job {job_id}: {e}", exc_info=True)
+        job_queue.update_job_status(job_id, JobStatus.FAILED, error=str(e))
+        # Em caso de exceção, deleta o arquivo se existir
+        if video_path:
+            delete_video_file(video_path)
+
+
+def main() -> None:
+    """Start RQ_WORKERS worker processes consuming the video queue."""
+    from redis import Redis
+    from rq import SimpleWorker
+    from rq.worker_pool import WorkerPool
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if not settings.REDIS_URL:
+        raise SystemExit("REDIS_URL não configurado - worker não tem fila para consumir")
+
+    connection = Redis.from_url(settings.REDIS_URL)
+    logger.info(f"Starting {settings.RQ_WORKERS} worker(s) on queue '{settings.RQ_QUEUE_NAME}'")
+
+    # SimpleWorker executa o job no próprio processo (sem fork por job),
+    # mantendo processor/publisher aquecidos entre renders
+    if settings.RQ_WORKERS > 1:
+        # Sem warmup aqui: o WorkerPool faz fork, e o loop de render (thread) não sobrevive ao fork
+        WorkerPool(
+            [settings.RQ_QUEUE_NAME],
+            connection=connection,
+            num_workers=settings.RQ_WORKERS,
+            worker_class=SimpleWorker
+        ).start()
+    else:
+        if settings.RENDER_PROCESSES == 0:
+            warmup_renderer(settings.VIDEO_OUTPUT_DIR)
+        SimpleWorker([settings.RQ_QUEUE_NAME], connection=connection).work()
+
+
+if __name__ == "__main__":
+    main()